@@ -2,11 +2,13 @@
 # This Python script is illustrative, based on patent documentation.
 # It simulates the Jetson Nano's role in receiving FFT data from STM32,
 # performing DSFT (SASF²/DASF²), and sending results back.
+# Frames carry every measurement channel at once and are processed as (channels, bins) batches.
 # Requires PySerial for UART and NumPy for array operations.
 # GPU acceleration (e.g., using CuPy for FFT/DSFT) would be a key feature in a real implementation.
 
 import numpy as np
 import math
+import struct
 import serial # For UART communication with STM32
 import time # For simulation
 
@@ -14,6 +16,25 @@ import time # For simulation
 NUM_ADC_SAMPLES_JETSON = 8000 # Must match STM32
 FFT_MAGNITUDE_SIZE_JETSON = NUM_ADC_SAMPLES_JETSON // 2 + 1
 BYTES_PER_FLOAT = 4 # Assuming 32-bit floats
+NUM_CHANNELS_JETSON = 3 # Default channel count for simulated frames; real frames carry it in the header
+
+# Frame header (must match SIF_FrameHeader on the STM32): magic, payload kind, channel count,
+# reserved, values per channel. Payload follows as float32.
+FRAME_HEADER_FORMAT = '<4sBBHI'
+FRAME_HEADER_SIZE = struct.calcsize(FRAME_HEADER_FORMAT)
+FRAME_MAGIC = b'SIF1'
+FRAME_KIND_FFT_MAGNITUDES = 1 # (channels, bins), channel-major: STM32 did the FFT
+FRAME_KIND_RAW_SAMPLES = 2 # (samples, channels), interleaved as scanned by the ADS1256 mux; used for coherence only
+FRAME_KIND_DSFT = 3 # (channels, bins), sent back to the STM32
+FRAME_KIND_FAULT_LABELS = 4 # (channels, 2): label id (-1 = none) and distance, follows every DSFT reply
+FRAME_KIND_COHERENCE = 5 # (channels, channels) coherence matrix, the reply to a raw-sample frame
+FRAME_KIND_FAULT_LABEL_NAMES = 6 # (channels, FAULT_LABEL_NAME_BYTES_JETSON / 4): NUL-padded UTF-8 label name, follows the labels
+FAULT_LABEL_NAME_BYTES_JETSON = 32 # Must match FAULT_LABEL_NAME_BYTES on the STM32 (a multiple of 4)
+# Request frames the STM32 may send, with the values per channel each must carry
+REQUEST_FRAME_SIZES_JETSON = {
+    FRAME_KIND_FFT_MAGNITUDES: FFT_MAGNITUDE_SIZE_JETSON,
+    FRAME_KIND_RAW_SAMPLES: NUM_ADC_SAMPLES_JETSON,
+}
 
 EPSILON_JETSON = 1e-9
 COHERENCE_THRESHOLD_SASF2_JETSON = 0.5 # Example [cite: 334]
@@ -24,36 +45,63 @@ COHERENCE_THRESHOLD_SASF2_JETSON = 0.5 # Example [cite: 334]
 SERIAL_PORT = '/dev/ttyUSB0' # Example if using USB-to-Serial adapter for testing
 BAUD_RATE = 115200 # Must match STM32
 
+# Fault-Signature Library (gateway-side labelling of anomalous frames)
+SIGNATURE_LIBRARY_PATH = 'fault_signatures.npz' # Keys: 'fingerprints' (DSFT outputs), 'labels'
+SIGNATURE_DISTANCE_METRIC = 'cosine' # 'cosine' or 'l1'
+SIGNATURE_NUM_BANDS = 64 # Log-spaced bands the DSFT fingerprint is pooled into
+SIGNATURE_K_NEIGHBOURS = 5
+SIGNATURE_BRUTE_FORCE_MAX = 4096 # Above this library size an approximate (IVF) index is built
+SIGNATURE_IVF_NUM_LISTS = 128 # Coarse clusters in the IVF index
+SIGNATURE_IVF_NUM_PROBES = 8 # Clusters scanned per query
+SIGNATURE_L1_CHUNK_ROWS = 8192 # Bounds the temporary (rows x bands) array for L1 search
+
+# Cross-channel coherence (only for raw-sample frames; magnitudes carry no phase)
+COHERENCE_SEGMENT_LENGTH_JETSON = 1024 # Samples per averaged segment, 50% overlap
+COHERENCE_INTERVAL_CYCLES_JETSON = 10 # Must match COHERENCE_INTERVAL_CYCLES: every Nth cycle a raw frame follows the FFT frame
+
+RUN_MULTICHANNEL_BENCHMARK = False # Set True to run benchmark_multichannel_scaling_jetson() instead of the loop
+RUN_LABELLING_BENCHMARK = False # Set True to run benchmark_signature_labelling_jetson() instead of the loop
+
 # --- DSFT Functions (Conceptual, potentially GPU accelerated with CuPy) ---
 
+_log_freq_denominators_cache = {}
+
+def log_freq_denominators_jetson(num_bins):
+    """
+    log(i + 2 + EPSILON) per bin, cached per spectrum length so batches and frames share it.
+    Using i+2 to prevent log(0) or log(1) issues if k=0,1 are problematic for the formula.
+    """
+    denominators = _log_freq_denominators_cache.get(num_bins)
+    if denominators is None:
+        denominators = np.log(np.arange(num_bins) + 2 + EPSILON_JETSON).astype(np.float32)
+        _log_freq_denominators_cache[num_bins] = denominators
+    return denominators
+
 def sasf2_transform_jetson(fft_magnitudes_np): #
     """
     Applies SASF² transform. In a real implementation on Jetson,
     this would be heavily optimized, possibly using CuPy for GPU.
+    Accepts a single spectrum or a (channels, bins) batch; bins are the last axis.
     """
     # print("Jetson: Applying SASF² transform...")
     if fft_magnitudes_np.size == 0:
         return np.array([])
 
-    # Ensure array is float for math operations
-    fft_magnitudes_np = fft_magnitudes_np.astype(float)
-    
-    # Log of frequency bin index (starts from 1 for log, or use i+2 to avoid log(1)=0)
-    # Using i+2 to prevent log(0) or log(1) issues if k=0,1 are problematic for the formula
-    freq_indices_log = np.log(np.arange(len(fft_magnitudes_np)) + 2 + EPSILON_JETSON)
-    
-    log_magnitudes = np.log(fft_magnitudes_np + EPSILON_JETSON)
-    
-    log_mag_over_log_freq = log_magnitudes / freq_indices_log
+    # float32 throughout (what is sent back anyway); one output buffer, then in-place ops
+    log_mag_over_log_freq = np.add(fft_magnitudes_np, EPSILON_JETSON, dtype=np.float32)
+    np.log(log_mag_over_log_freq, out=log_mag_over_log_freq)
+    log_mag_over_log_freq /= log_freq_denominators_jetson(fft_magnitudes_np.shape[-1])
     
     # Handle potential NaN/inf from divisions or logs if epsilon wasn't enough
-    log_mag_over_log_freq[np.isnan(log_mag_over_log_freq) | np.isinf(log_mag_over_log_freq)] = 0.0
+    log_mag_over_log_freq[~np.isfinite(log_mag_over_log_freq)] = 0.0
     
     # Conceptual coherence term
-    coherence_effect = np.exp(-np.abs(log_mag_over_log_freq) / COHERENCE_THRESHOLD_SASF2_JETSON)
+    coherence_effect = np.abs(log_mag_over_log_freq)
+    coherence_effect *= -1.0 / COHERENCE_THRESHOLD_SASF2_JETSON
+    np.exp(coherence_effect, out=coherence_effect)
     
-    transformed_fft = log_mag_over_log_freq * coherence_effect
-    return transformed_fft.astype(np.float32) # Ensure float32 for sending back
+    log_mag_over_log_freq *= coherence_effect
+    return log_mag_over_log_freq
 
 def dasf2_transform_jetson(fft_magnitudes_np, sasf2_transformed_fft_np):
     """
@@ -69,7 +117,382 @@ def dasf2_transform_jetson(fft_magnitudes_np, sasf2_transformed_fft_np):
     # This is a placeholder. A real DASF2 would involve more complex logic
     # based on deviation from a spectral mean (mu) and a dissipation threshold (D).
     # For now, just return the SASF2 output.
-    return sasf2_transformed_fft_np.astype(np.float32)
+    return np.asarray(sasf2_transformed_fft_np, dtype=np.float32) # No copy when already float32
+
+
+# --- Multi-Channel Processing ---
+
+def parse_frame_header_jetson(header_bytes):
+    """Returns (payload_kind, num_channels, values_per_channel). Raises ValueError on a bad header."""
+    magic, payload_kind, num_channels, _, values_per_channel = struct.unpack(FRAME_HEADER_FORMAT, header_bytes)
+    if magic != FRAME_MAGIC:
+        raise ValueError(f"Bad frame magic: {magic!r}")
+    return payload_kind, num_channels, values_per_channel
+
+def validate_request_header_jetson(payload_kind, num_channels, values_per_channel):
+    """
+    Raises ValueError unless the header describes a request this co-processor handles:
+    a known request kind, at least one channel, and the exact size that kind must have.
+    """
+    expected_values = REQUEST_FRAME_SIZES_JETSON.get(payload_kind)
+    if expected_values is None:
+        raise ValueError(f"Unsupported payload kind {payload_kind}")
+    if num_channels < 1:
+        raise ValueError("Frame carries no channels")
+    if values_per_channel != expected_values:
+        raise ValueError(f"{values_per_channel} values per channel for payload kind {payload_kind}, expected {expected_values}")
+
+def read_frame_header_jetson(ser):
+    """
+    Reads the next frame header from the serial port, skipping bytes until FRAME_MAGIC so a
+    link that lost sync (dropped bytes, a frame abandoned mid-payload) recovers at the next
+    frame. Returns b'' on timeout.
+    """
+    window = b''
+    while window != FRAME_MAGIC:
+        byte = ser.read(1)
+        if not byte:
+            return b''
+        window = (window + byte)[-len(FRAME_MAGIC):]
+    return window + ser.read(FRAME_HEADER_SIZE - len(FRAME_MAGIC))
+
+def build_frame_header_jetson(payload_kind, num_channels, values_per_channel):
+    return struct.pack(FRAME_HEADER_FORMAT, FRAME_MAGIC, payload_kind, num_channels, 0, values_per_channel)
+
+def frame_payload_to_channels_jetson(payload_bytes, payload_kind, num_channels, values_per_channel):
+    """
+    Views a frame payload as a (channels, values) array without copying.
+    Raw-sample frames arrive interleaved (sample-major), so they are viewed transposed.
+    """
+    values = np.frombuffer(payload_bytes, dtype=np.float32)
+    if payload_kind == FRAME_KIND_RAW_SAMPLES:
+        return values.reshape(values_per_channel, num_channels).T
+    return values.reshape(num_channels, values_per_channel)
+
+def fractal_divergence_per_channel_jetson(baseline_dsft_np, current_dsft_np):
+    """SDI per channel: mean absolute DSFT difference along the bin axis."""
+    return np.mean(np.abs(baseline_dsft_np - current_dsft_np), axis=-1)
+
+def cross_channel_coherence_jetson(channel_samples_np, segment_length=COHERENCE_SEGMENT_LENGTH_JETSON):
+    """
+    Magnitude-squared coherence between every pair of channels, averaged over frequency.
+    Cross-spectra are averaged over Hann-windowed, 50%-overlapped segments (a single
+    segment would always give coherence 1). Returns a (channels, channels) matrix.
+    """
+    segment_length = min(segment_length, channel_samples_np.shape[-1])
+    hop = max(1, segment_length // 2)
+    segments = np.lib.stride_tricks.sliding_window_view(channel_samples_np, segment_length, axis=-1)[:, ::hop, :]
+    spectra = np.fft.rfft(segments * np.hanning(segment_length), axis=-1) # (channels, segments, bins)
+    cross_spectra = np.einsum('isf,jsf->ijf', spectra, np.conj(spectra)) / spectra.shape[1]
+    auto_spectra = np.real(np.diagonal(cross_spectra, axis1=0, axis2=1)).T # (channels, bins)
+    coherence = np.abs(cross_spectra) ** 2 / (auto_spectra[:, np.newaxis, :] * auto_spectra[np.newaxis, :, :] + EPSILON_JETSON)
+    return coherence.mean(axis=-1)
+
+def benchmark_multichannel_scaling_jetson(max_channels=8, repeats=200):
+    """
+    Compares the batched DSP path for one frame (SASF² + DASF² + SDI over all channels, one
+    call each) with running it once per channel. Prints per-frame cost in milliseconds and a
+    least-squares fit cost = fixed + slope * channels for both. The work is elementwise, so
+    batching cannot make it sub-linear: it only pays the per-call overhead once per frame,
+    which shows up as a lower slope. Fault labelling is not included.
+    """
+    rng = np.random.default_rng(0)
+
+    def run_pipeline(fft_mags, baseline):
+        dsft = dasf2_transform_jetson(fft_mags, sasf2_transform_jetson(fft_mags))
+        fractal_divergence_per_channel_jetson(baseline, dsft)
+
+    print("channels | batched ms | looped ms")
+    channel_counts = np.arange(1, max_channels + 1)
+    batched_ms, looped_ms = [], []
+    for num_channels in channel_counts:
+        fft_mags = rng.random((num_channels, FFT_MAGNITUDE_SIZE_JETSON), dtype=np.float32) * 10.0
+        baseline = sasf2_transform_jetson(fft_mags)
+
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            run_pipeline(fft_mags, baseline)
+        batched_ms.append((time.perf_counter() - t0) * 1000 / repeats)
+
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            for ch in range(num_channels):
+                run_pipeline(fft_mags[ch:ch + 1], baseline[ch:ch + 1])
+        looped_ms.append((time.perf_counter() - t0) * 1000 / repeats)
+        print(f"{num_channels:8d} | {batched_ms[-1]:10.3f} | {looped_ms[-1]:9.3f}")
+
+    for name, costs in (("batched", batched_ms), ("looped", looped_ms)):
+        slope, fixed = np.polyfit(channel_counts, costs, 1)
+        print(f"{name}: {fixed:.3f} ms fixed + {slope:.3f} ms per channel")
+
+
+# --- Fault-Signature Library (Nearest-neighbour search over DSFT fingerprints) ---
+# SDI only says a spectrum moved away from its own baseline. The library holds DSFT
+# fingerprints of known faults (bearing outer race, misalignment, looseness, ...) so
+# an anomalous frame can be labelled with the closest known fault.
+
+def build_band_edges_jetson(num_bins, num_bands=SIGNATURE_NUM_BANDS):
+    """
+    Log-spaced band edges for pooling a DSFT fingerprint.
+    Low bins get narrow bands, high bins get wide ones, matching the log-frequency
+    weighting already used by SASF². Duplicate edges at the low end are merged,
+    so fewer than num_bands bands may be returned for short spectra.
+    """
+    edges = np.round(np.geomspace(1, num_bins + 1, num_bands + 1)).astype(np.int64) - 1
+    return np.unique(edges)
+
+def pool_dsft_bands_jetson(dsft_fingerprints_np, band_edges):
+    """Averages DSFT bins within each band. Works on a single frame or a (rows, bins) stack."""
+    band_sums = np.add.reduceat(dsft_fingerprints_np, band_edges[:-1], axis=-1)
+    return band_sums / np.diff(band_edges)
+
+def signature_vectors_jetson(dsft_fingerprints_np, band_edges, metric=SIGNATURE_DISTANCE_METRIC):
+    """
+    Turns DSFT fingerprints into search vectors: band pooling, float32, and for the
+    cosine metric unit normalisation so that cosine distance is a single dot product.
+    """
+    vectors = pool_dsft_bands_jetson(np.atleast_2d(dsft_fingerprints_np), band_edges).astype(np.float32)
+    if metric == 'cosine':
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.maximum(norms, EPSILON_JETSON)
+    return vectors
+
+def signature_distances_jetson(library_vectors, query_vectors, metric=SIGNATURE_DISTANCE_METRIC):
+    """Returns a (queries, library rows) distance matrix."""
+    if metric == 'cosine':
+        return 1.0 - query_vectors @ library_vectors.T
+    if metric == 'l1':
+        distances = np.empty((len(query_vectors), len(library_vectors)), dtype=np.float32)
+        # Broadcasting the whole library at once would allocate queries x rows x bands floats
+        rows_per_block = max(1, SIGNATURE_L1_CHUNK_ROWS // max(1, len(query_vectors)))
+        for start in range(0, len(library_vectors), rows_per_block):
+            block = library_vectors[start:start + rows_per_block]
+            distances[:, start:start + len(block)] = np.abs(query_vectors[:, np.newaxis, :] - block[np.newaxis, :, :]).sum(axis=2)
+        return distances
+    raise ValueError(f"Unknown signature distance metric: {metric}")
+
+def knn_search_bruteforce_jetson(library_vectors, query_vectors, k=SIGNATURE_K_NEIGHBOURS, metric=SIGNATURE_DISTANCE_METRIC):
+    """
+    Exact k-nearest-neighbour search, vectorized over the whole library.
+    Returns (indices, distances), each of shape (queries, k), nearest first.
+    """
+    query_vectors = np.atleast_2d(query_vectors)
+    k = min(k, len(library_vectors))
+    distances = signature_distances_jetson(library_vectors, query_vectors, metric)
+    # argpartition is O(rows); only the k survivors are fully sorted
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+    order = np.argsort(nearest_distances, axis=1)
+    return np.take_along_axis(nearest, order, axis=1), np.take_along_axis(nearest_distances, order, axis=1)
+
+def build_ivf_index_jetson(library_vectors, num_lists=SIGNATURE_IVF_NUM_LISTS, metric=SIGNATURE_DISTANCE_METRIC, iterations=8, seed=0):
+    """
+    Approximate index for large libraries (inverted file / IVF).
+    A few k-means iterations split the library into num_lists clusters; a query then
+    only scans the members of its closest clusters instead of the whole library.
+    Cluster members are stored contiguously ('order' sliced by 'offsets').
+    """
+    rng = np.random.default_rng(seed)
+    num_lists = min(num_lists, len(library_vectors))
+    centroids = library_vectors[rng.choice(len(library_vectors), num_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = np.argmin(signature_distances_jetson(centroids, library_vectors, metric), axis=1)
+        counts = np.bincount(assignments, minlength=num_lists)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, library_vectors)
+        non_empty = counts > 0 # Empty clusters keep their previous centroid
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, np.newaxis]
+        if metric == 'cosine':
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), EPSILON_JETSON)
+
+    assignments = np.argmin(signature_distances_jetson(centroids, library_vectors, metric), axis=1)
+    order = np.argsort(assignments, kind='stable')
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=num_lists))))
+    return {'centroids': centroids, 'order': order, 'offsets': offsets}
+
+def knn_search_ivf_jetson(library_vectors, ivf_index, query_vectors, k=SIGNATURE_K_NEIGHBOURS, metric=SIGNATURE_DISTANCE_METRIC, num_probes=SIGNATURE_IVF_NUM_PROBES):
+    """
+    Approximate k-nearest-neighbour search through an IVF index.
+    Same return shape as the brute-force search; slots that could not be filled
+    (fewer than k candidates in the probed clusters) hold index -1 and distance inf.
+    """
+    query_vectors = np.atleast_2d(query_vectors)
+    order, offsets = ivf_index['order'], ivf_index['offsets']
+    probed_lists, _ = knn_search_bruteforce_jetson(ivf_index['centroids'], query_vectors, num_probes, metric)
+
+    indices = np.full((len(query_vectors), k), -1, dtype=np.int64)
+    distances = np.full((len(query_vectors), k), np.inf, dtype=np.float32)
+    for q, lists in enumerate(probed_lists):
+        candidates = np.concatenate([order[offsets[l]:offsets[l + 1]] for l in lists])
+        if len(candidates) == 0:
+            continue
+        nearest, nearest_distances = knn_search_bruteforce_jetson(library_vectors[candidates], query_vectors[q], k, metric)
+        indices[q, :nearest.shape[1]] = candidates[nearest[0]]
+        distances[q, :nearest.shape[1]] = nearest_distances[0]
+    return indices, distances
+
+def build_fault_signature_library_jetson(dsft_fingerprints_np, labels, metric=SIGNATURE_DISTANCE_METRIC, num_bands=SIGNATURE_NUM_BANDS):
+    """
+    Builds the searchable library from DSFT fingerprints (outputs of sasf2_transform_jetson /
+    dasf2_transform_jetson) and their fault labels. An IVF index is only built once the
+    library is too large for brute force to stay within the frame budget.
+    """
+    dsft_fingerprints_np = np.atleast_2d(np.asarray(dsft_fingerprints_np, dtype=np.float32))
+    band_edges = build_band_edges_jetson(dsft_fingerprints_np.shape[1], num_bands)
+    library_vectors = signature_vectors_jetson(dsft_fingerprints_np, band_edges, metric)
+    return index_fault_signature_vectors_jetson(library_vectors, labels, band_edges, metric)
+
+def index_fault_signature_vectors_jetson(library_vectors, labels, band_edges, metric=SIGNATURE_DISTANCE_METRIC):
+    """
+    Builds the searchable library from already pooled signature vectors (signature_vectors_jetson
+    with the same band_edges), so large libraries can be pooled in chunks.
+    """
+    ivf_index = None
+    if len(library_vectors) > SIGNATURE_BRUTE_FORCE_MAX:
+        ivf_index = build_ivf_index_jetson(library_vectors, SIGNATURE_IVF_NUM_LISTS, metric)
+
+    # Labels travel to the STM32 as ids into label_names, plus the name itself for publishing
+    label_names, label_ids = np.unique(np.asarray(labels), return_inverse=True)
+
+    return {
+        'vectors': library_vectors,
+        'label_names': label_names,
+        'label_name_table': encode_label_names_jetson(label_names),
+        'label_ids': label_ids,
+        'band_edges': band_edges,
+        'metric': metric,
+        'ivf_index': ivf_index,
+    }
+
+def encode_label_names_jetson(label_names, name_bytes=FAULT_LABEL_NAME_BYTES_JETSON):
+    """
+    Fixed-width, NUL-padded UTF-8 label names, one row per label id, as sent to the STM32.
+    Names are cut at a character boundary to leave room for the NUL. A final all-zero row is
+    what label id -1 (no match) indexes.
+    """
+    table = np.zeros((len(label_names) + 1, name_bytes), dtype=np.uint8)
+    for i, name in enumerate(label_names):
+        encoded = str(name).encode('utf-8')[:name_bytes - 1].decode('utf-8', 'ignore').encode('utf-8')
+        table[i, :len(encoded)] = np.frombuffer(encoded, dtype=np.uint8)
+    return table
+
+def load_fault_signature_library_jetson(path=SIGNATURE_LIBRARY_PATH):
+    """
+    Loads fingerprints and labels from an .npz file. Returns None if no library is deployed,
+    the file cannot be read (e.g. labels saved as an object array), or the fingerprints were
+    built for a different FFT size.
+    """
+    try:
+        with np.load(path) as library_file:
+            fingerprints, labels = library_file['fingerprints'], library_file['labels']
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Jetson: No fault-signature library loaded from {path} ({e}). Frames will not be labelled.")
+        return None
+    if fingerprints.ndim != 2 or fingerprints.shape[1] != FFT_MAGNITUDE_SIZE_JETSON or len(labels) != len(fingerprints):
+        print(f"Jetson: Fault-signature library {path} has fingerprints of shape {fingerprints.shape} and "
+              f"{len(labels)} labels; expected (rows, {FFT_MAGNITUDE_SIZE_JETSON}). Frames will not be labelled.")
+        return None
+    return build_fault_signature_library_jetson(fingerprints, labels)
+
+def label_dsft_frames_jetson(signature_library, dsft_frames_np, k=SIGNATURE_K_NEIGHBOURS):
+    """
+    Labels DSFT frames (one per channel) with the closest known fault, in one batched query.
+    Neighbours vote with weight 1/distance, so one very close match outweighs several
+    distant ones. Returns (label_ids, distances): ids index signature_library['label_names']
+    (-1 where no neighbour was found), distances are to the nearest signature with that label.
+    """
+    metric = signature_library['metric']
+    queries = signature_vectors_jetson(dsft_frames_np, signature_library['band_edges'], metric)
+
+    if signature_library['ivf_index'] is not None:
+        indices, distances = knn_search_ivf_jetson(signature_library['vectors'], signature_library['ivf_index'], queries, k, metric)
+    else:
+        indices, distances = knn_search_bruteforce_jetson(signature_library['vectors'], queries, k, metric)
+
+    num_labels = len(signature_library['label_names'])
+    label_ids = np.full(len(queries), -1, dtype=np.int32)
+    label_distances = np.full(len(queries), np.inf, dtype=np.float32)
+    for q in range(len(queries)):
+        valid = indices[q] >= 0
+        if not valid.any():
+            continue
+        neighbour_ids = signature_library['label_ids'][indices[q][valid]]
+        neighbour_distances = np.maximum(distances[q][valid], 0.0) # Cosine distance can round slightly below 0
+        votes = np.bincount(neighbour_ids, weights=1.0 / (neighbour_distances + EPSILON_JETSON), minlength=num_labels)
+        best = np.argmax(votes)
+        label_ids[q] = best
+        label_distances[q] = neighbour_distances[neighbour_ids == best].min()
+    return label_ids, label_distances
+
+def benchmark_signature_labelling_jetson(library_sizes=(SIGNATURE_BRUTE_FORCE_MAX, 30000), num_faults=32, num_queries=300, repeats=50, seed=0):
+    """
+    Labelling latency per frame (NUM_CHANNELS_JETSON queries) for libraries of each size, on
+    synthetic fingerprints: noisy variants of num_faults prototype spectra. Sizes above
+    SIGNATURE_BRUTE_FORCE_MAX go through the IVF index; for those, recall@k of the IVF
+    neighbours against an exact brute-force search over the same vectors is reported too.
+    Labelling includes pooling and the vote; the exact-search column is the search alone.
+    """
+    rng = np.random.default_rng(seed)
+    prototypes = rng.random((num_faults, FFT_MAGNITUDE_SIZE_JETSON), dtype=np.float32) * 10.0
+    band_edges = build_band_edges_jetson(FFT_MAGNITUDE_SIZE_JETSON)
+
+    def noisy_fingerprints(fault_ids):
+        noise = np.exp(0.5 * rng.standard_normal((len(fault_ids), FFT_MAGNITUDE_SIZE_JETSON), dtype=np.float32))
+        return sasf2_transform_jetson(prototypes[fault_ids] * noise)
+
+    print("rows | index | build s | labelling ms/frame | exact search ms/frame | recall@k")
+    for library_size in library_sizes:
+        labels = rng.integers(0, num_faults, library_size)
+        # Pooled in chunks: the raw fingerprints of a large library would not fit in memory at once
+        library_vectors = np.concatenate([signature_vectors_jetson(noisy_fingerprints(labels[start:start + SIGNATURE_L1_CHUNK_ROWS]), band_edges)
+                                          for start in range(0, library_size, SIGNATURE_L1_CHUNK_ROWS)])
+        t0 = time.perf_counter()
+        signature_library = index_fault_signature_vectors_jetson(library_vectors, labels, band_edges)
+        build_s = time.perf_counter() - t0
+
+        frame = noisy_fingerprints(rng.integers(0, num_faults, NUM_CHANNELS_JETSON))
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            label_dsft_frames_jetson(signature_library, frame)
+        labelling_ms = (time.perf_counter() - t0) * 1000 / repeats
+
+        frame_vectors = signature_vectors_jetson(frame, band_edges)
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            knn_search_bruteforce_jetson(library_vectors, frame_vectors)
+        brute_force_ms = (time.perf_counter() - t0) * 1000 / repeats
+
+        recall = "-"
+        if signature_library['ivf_index'] is not None:
+            queries = signature_vectors_jetson(noisy_fingerprints(rng.integers(0, num_faults, num_queries)), band_edges)
+            exact, _ = knn_search_bruteforce_jetson(library_vectors, queries)
+            approximate, _ = knn_search_ivf_jetson(library_vectors, signature_library['ivf_index'], queries)
+            hits = sum(len(np.intersect1d(exact[q], approximate[q])) for q in range(num_queries))
+            recall = f"{hits / exact.size:.3f}"
+        index_name = "IVF" if signature_library['ivf_index'] is not None else "brute"
+        print(f"{library_size:5d} | {index_name:>5} | {build_s:7.2f} | {labelling_ms:18.3f} | {brute_force_ms:21.3f} | {recall:>8}")
+
+def build_dsft_reply_jetson(dsft_output_np, label_ids, label_distances, label_name_table=None):
+    """
+    DSFT frame followed by the fault-label and label-name frames, as the STM32 expects them.
+    label_name_table is signature_library['label_name_table']; without one all names are empty.
+    """
+    num_channels, num_bins = dsft_output_np.shape
+    fault_labels = np.stack([label_ids.astype(np.float32), label_distances.astype(np.float32)], axis=1)
+    if label_name_table is None:
+        label_name_rows = np.zeros((num_channels, FAULT_LABEL_NAME_BYTES_JETSON), dtype=np.uint8)
+    else:
+        label_name_rows = label_name_table[label_ids] # -1 picks the empty last row
+    return (build_frame_header_jetson(FRAME_KIND_DSFT, num_channels, num_bins) + dsft_output_np.astype(np.float32).tobytes() +
+            build_frame_header_jetson(FRAME_KIND_FAULT_LABELS, num_channels, 2) + fault_labels.tobytes() +
+            build_frame_header_jetson(FRAME_KIND_FAULT_LABEL_NAMES, num_channels, label_name_rows.shape[1] // BYTES_PER_FLOAT) +
+            label_name_rows.tobytes())
+
+def build_coherence_reply_jetson(channel_coherence):
+    """Coherence frame, the reply to a raw-sample frame."""
+    num_channels = len(channel_coherence)
+    return build_frame_header_jetson(FRAME_KIND_COHERENCE, num_channels, num_channels) + channel_coherence.astype(np.float32).tobytes()
 
 
 # --- Main Communication Loop ---
@@ -84,34 +507,77 @@ def jetson_coprocessor_loop():
     #     print("Exiting Jetson conceptual script.")
     #     return
 
-    expected_bytes = FFT_MAGNITUDE_SIZE_JETSON * BYTES_PER_FLOAT
+    signature_library = load_fault_signature_library_jetson()
+    cycle = 0
 
     while True:
-        # print(f"\nJetson: Waiting for {expected_bytes} bytes of FFT data from STM32...")
-        # received_bytes = ser.read(expected_bytes)
+        # header_bytes = read_frame_header_jetson(ser)
         
         # Simulate receiving data if serial is not available for standalone testing
         time.sleep(0.5) # Simulate processing delay / wait
-        print("Jetson: Simulating received FFT data...")
-        dummy_fft_magnitudes = np.random.rand(FFT_MAGNITUDE_SIZE_JETSON).astype(np.float32) * 10.0
-        received_bytes = dummy_fft_magnitudes.tobytes()
+        cycle += 1
+        if cycle % COHERENCE_INTERVAL_CYCLES_JETSON == 0:
+            print("Jetson: Simulating received raw-sample frame...")
+            header_bytes = build_frame_header_jetson(FRAME_KIND_RAW_SAMPLES, NUM_CHANNELS_JETSON, NUM_ADC_SAMPLES_JETSON)
+            dummy_payload = np.random.randn(NUM_ADC_SAMPLES_JETSON, NUM_CHANNELS_JETSON).astype(np.float32)
+        else:
+            print("Jetson: Simulating received FFT data...")
+            header_bytes = build_frame_header_jetson(FRAME_KIND_FFT_MAGNITUDES, NUM_CHANNELS_JETSON, FFT_MAGNITUDE_SIZE_JETSON)
+            dummy_payload = np.random.rand(NUM_CHANNELS_JETSON, FFT_MAGNITUDE_SIZE_JETSON).astype(np.float32) * 10.0
 
+        try:
+            payload_kind, num_channels, values_per_channel = parse_frame_header_jetson(header_bytes)
+        except (struct.error, ValueError) as e:
+            print(f"Jetson: Dropping frame with invalid header ({e}).")
+            continue # read_frame_header_jetson() resyncs on the next FRAME_MAGIC
+        expected_bytes = num_channels * values_per_channel * BYTES_PER_FLOAT
+        # print(f"\nJetson: Waiting for {expected_bytes} bytes ({num_channels} channels) from STM32...")
+        try:
+            validate_request_header_jetson(payload_kind, num_channels, values_per_channel)
+        except ValueError as e:
+            print(f"Jetson: Dropping frame ({e}).")
+            # if values_per_channel <= max(REQUEST_FRAME_SIZES_JETSON.values()):
+            #     ser.read(expected_bytes) # Discard the payload so the next header read is aligned
+            continue # Implausible sizes are left to the FRAME_MAGIC resync instead
+        # received_bytes = ser.read(expected_bytes)
+        received_bytes = dummy_payload.tobytes()
 
         if len(received_bytes) == expected_bytes:
-            # print("Jetson: FFT data received. Processing...")
-            # Convert bytes to NumPy array of floats
-            fft_magnitudes_from_stm32 = np.frombuffer(received_bytes, dtype=np.float32)
+            # print("Jetson: Frame received. Processing...")
+            # Zero-copy (channels, values) view of the payload
+            channel_data = frame_payload_to_channels_jetson(received_bytes, payload_kind, num_channels, values_per_channel)
+
+            if payload_kind == FRAME_KIND_RAW_SAMPLES:
+                # Raw scans only feed coherence. The DSFT (and so the SDI) always comes from the
+                # STM32's own FFT, the same path its baseline was calibrated through.
+                channel_coherence = cross_channel_coherence_jetson(channel_data)
+                reply_bytes = build_coherence_reply_jetson(channel_coherence)
+                # ser.write(reply_bytes)
+                print(f"Jetson: Coherence reply ready ({len(reply_bytes)} bytes):\n{np.round(channel_coherence, 3)}")
+                continue
+
+            fft_magnitudes_from_stm32 = channel_data
             
-            # Perform SASF² Transform
+            # Perform SASF² Transform (all channels in one call)
             sasf2_output = sasf2_transform_jetson(fft_magnitudes_from_stm32)
             
             # Perform DASF² Transform (conceptually refining SASF² output or using original FFT)
             dsft_final_output = dasf2_transform_jetson(fft_magnitudes_from_stm32, sasf2_output) # Pass original FFT too if needed by DASF2
             
+            # Label every channel against known fault signatures. The labels and their names go back
+            # with every reply; the STM32 publishes them alongside the alert of any channel over threshold.
+            if signature_library is not None:
+                label_ids, label_distances = label_dsft_frames_jetson(signature_library, dsft_final_output)
+                label_name_table = signature_library['label_name_table']
+            else:
+                label_ids = np.full(num_channels, -1, dtype=np.int32)
+                label_distances = np.full(num_channels, np.inf, dtype=np.float32)
+                label_name_table = None
+
+            reply_bytes = build_dsft_reply_jetson(dsft_final_output, label_ids, label_distances, label_name_table)
             # print("Jetson: DSFT processing complete. Sending results back to STM32...")
-            # ser.write(dsft_final_output.tobytes())
-            # print(f"Jetson: Sent {len(dsft_final_output.tobytes())} bytes of DSFT data.")
-            # print(f"Sample of DSFT output: {dsft_final_output[:5]}")
+            # ser.write(reply_bytes)
+            print(f"Jetson: Reply ready ({len(reply_bytes)} bytes), fault label ids per channel: {label_ids.tolist()}")
 
 
         # elif len(received_bytes) > 0:
@@ -126,7 +592,12 @@ def jetson_coprocessor_loop():
 
 if __name__ == "__main__":
     try:
-        jetson_coprocessor_loop()
+        if RUN_MULTICHANNEL_BENCHMARK:
+            benchmark_multichannel_scaling_jetson()
+        elif RUN_LABELLING_BENCHMARK:
+            benchmark_signature_labelling_jetson()
+        else:
+            jetson_coprocessor_loop()
     except KeyboardInterrupt:
         print("Jetson co-processor script stopped by user.")
     # finally:
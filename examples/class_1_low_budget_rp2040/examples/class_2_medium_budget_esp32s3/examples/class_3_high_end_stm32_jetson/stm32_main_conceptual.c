@@ -4,7 +4,9 @@
 // DSP libraries for FFT, and detailed communication protocols are required.
 
 #include <stdio.h>
+#include <stdint.h>
 #include <string.h>
+#include <stdlib.h> // For rand in the simulated peripherals
 #include <math.h> // For fabs, log, exp for potential local DSP stubs
 // #include "stm32h7xx_hal.h" // Would be included in a real STM32 project
 // #include "ads1256_driver.h" // Placeholder for ADS1256 driver
@@ -17,28 +19,70 @@
 // --- Configuration (Conceptual) ---
 #define NUM_ADC_SAMPLES 8000 // Example: 80kHz for 0.1s [cite: 322]
 #define FFT_MAGNITUDE_SIZE (NUM_ADC_SAMPLES / 2 + 1)
+#define NUM_CHANNELS 3 // ADS1256 inputs scanned per sample period (e.g. tri-axial X/Y/Z)
+#define COHERENCE_INTERVAL_CYCLES 10 // Every Nth monitoring cycle also sends the raw scan so the Jetson can return cross-channel coherence
 #define ALERT_SDI_THRESHOLD_HIGH_END 500.0f
 #define MQTT_BROKER_HIGH_END "your_critical_mqtt_broker.com"
 #define MQTT_CLIENT_ID_HIGH_END "sif_stm32_jetson_node_01"
 
+// --- Frame Header (must match FRAME_HEADER_FORMAT on the Jetson side) ---
+#define FRAME_MAGIC "SIF1"
+#define FRAME_KIND_FFT_MAGNITUDES 1 // (channels, bins), channel-major
+#define FRAME_KIND_RAW_SAMPLES 2    // (samples, channels), interleaved as scanned
+#define FRAME_KIND_DSFT 3           // (channels, bins), reply from the Jetson
+#define FRAME_KIND_FAULT_LABELS 4   // (channels, 2): fault label id (-1 = none) and distance, follows each DSFT reply
+#define FRAME_KIND_COHERENCE 5      // (channels, channels): magnitude-squared coherence, the reply to a raw-sample frame
+#define FRAME_KIND_FAULT_LABEL_NAMES 6 // (channels, FAULT_LABEL_NAME_BYTES / 4): NUL-padded UTF-8 label name, follows the labels
+#define FAULT_LABEL_NAME_BYTES 32   // Must match FAULT_LABEL_NAME_BYTES_JETSON
+
+typedef struct __attribute__((packed)) {
+    char magic[4];
+    uint8_t payload_kind;
+    uint8_t num_channels;
+    uint16_t reserved;
+    uint32_t values_per_channel;
+} SIF_FrameHeader;
+
 // --- Global State (Conceptual) ---
-float baseline_dsft_transformed_fft[FFT_MAGNITUDE_SIZE];
+float baseline_dsft_transformed_fft[NUM_CHANNELS][FFT_MAGNITUDE_SIZE];
 int is_sensor_calibrated = 0;
 
+// Acquisition and transform buffers are static: NUM_CHANNELS x NUM_ADC_SAMPLES floats do not fit on the stack
+static float interleaved_scan_buffer[NUM_ADC_SAMPLES * NUM_CHANNELS];
+static float channel_signals[NUM_CHANNELS][NUM_ADC_SAMPLES];
+static float channel_fft_magnitudes[NUM_CHANNELS][FFT_MAGNITUDE_SIZE];
+static float channel_dsft_transformed[NUM_CHANNELS][FFT_MAGNITUDE_SIZE];
+static float channel_fault_labels[NUM_CHANNELS][2]; // Closest known fault per channel, from the Jetson's signature library
+static char channel_fault_label_names[NUM_CHANNELS][FAULT_LABEL_NAME_BYTES]; // Name of that fault ("" if none)
+static float channel_coherence[NUM_CHANNELS][NUM_CHANNELS]; // Band-averaged coherence between channel pairs, from the Jetson
+#define MAX_REPLY_PAYLOAD_BYTES sizeof(channel_dsft_transformed) // Largest frame the Jetson sends
+
 // --- Placeholder Function Stubs for Peripherals & DSP ---
 // In a real system, these would interact with hardware drivers and DSP libraries.
 
-void ADS1256_Read_Samples(float* buffer, int num_samples) { // [cite: 327, 329]
-    // printf("STM32: Reading %d samples from ADS1256 (Conceptual)...\n", num_samples);
-    // Simulate data
-    for (int i = 0; i < num_samples; ++i) {
+void ADS1256_Read_Samples_Interleaved(float* buffer, int num_samples, int num_channels) { // [cite: 327, 329]
+    // printf("STM32: Scanning %d channels x %d samples from ADS1256 (Conceptual)...\n", num_channels, num_samples);
+    // The ADS1256 input mux is cycled once per sample period, so samples arrive as
+    // buffer[i * num_channels + ch]. Simulate data
+    for (int i = 0; i < num_samples * num_channels; ++i) {
         buffer[i] = (float)rand() / RAND_MAX * 2.0f - 1.0f; // Random signal -1 to 1
     }
 }
 
+void deinterleave_channels(const float* interleaved, float signals[][NUM_ADC_SAMPLES], int num_samples, int num_channels) {
+    // Channel-major layout so each channel's FFT reads contiguous memory
+    for (int i = 0; i < num_samples; ++i) {
+        for (int ch = 0; ch < num_channels; ++ch) {
+            signals[ch][i] = interleaved[i * num_channels + ch];
+        }
+    }
+}
+
 void perform_local_fft_magnitudes(const float* signal, float* fft_mags, int num_samples) { // [cite: 327]
     // printf("STM32: Performing local FFT (Conceptual)...\n");
     // Placeholder: A real FFT (e.g., from ARM CMSIS-DSP) would be used.
+    // Baseline and monitoring DSFT both come from this function, so SDI compares spectra with the
+    // same scaling; fault signatures must be recorded through it too. Note arm_rfft_fast_f32 is unscaled.
     // This simplified version just populates with dummy magnitude data.
     int output_size = num_samples / 2 + 1;
     for (int k = 0; k < output_size; ++k) {
@@ -60,6 +104,94 @@ void UART_Receive_From_Jetson(float* buffer, int num_floats_expected) { //
     }
 }
 
+void UART_Send_Frame_To_Jetson(uint8_t payload_kind, const float* data, int num_channels, int values_per_channel) {
+    SIF_FrameHeader header;
+    memcpy(header.magic, FRAME_MAGIC, 4);
+    header.payload_kind = payload_kind;
+    header.num_channels = (uint8_t)num_channels;
+    header.reserved = 0;
+    header.values_per_channel = (uint32_t)values_per_channel;
+    // UART_Send_Bytes((const uint8_t*)&header, sizeof(header)); // Actual UART transmission of the header
+    UART_Send_To_Jetson(data, num_channels * values_per_channel);
+}
+
+void UART_Flush_From_Jetson(void) {
+    // Drops bytes still pending from an abandoned reply (e.g. the frames after a rejected one)
+    // while (UART_Bytes_Available()) { uint8_t byte; UART_Receive_Bytes(&byte, 1); }
+}
+
+void UART_Discard_From_Jetson(uint32_t num_bytes) {
+    // Reads and drops a payload, so the next header read starts on a frame boundary
+    // uint8_t scratch[64];
+    // while (num_bytes > 0) { uint32_t n = num_bytes < sizeof(scratch) ? num_bytes : sizeof(scratch); UART_Receive_Bytes(scratch, n); num_bytes -= n; }
+}
+
+void UART_Receive_Frame_Header(SIF_FrameHeader* header) {
+    // Skips bytes until FRAME_MAGIC, so a link that lost sync recovers at the next frame header
+    uint8_t* raw = (uint8_t*)header;
+    int matched = 0;
+    while (matched < 4) {
+        uint8_t byte;
+        // UART_Receive_Bytes(&byte, 1); // Actual UART reception
+        byte = (uint8_t)FRAME_MAGIC[matched]; // Simulate an aligned stream
+        if (byte == (uint8_t)FRAME_MAGIC[matched]) {
+            raw[matched++] = byte;
+        } else {
+            matched = (byte == (uint8_t)FRAME_MAGIC[0]) ? 1 : 0; // raw[0] already holds the first magic byte
+        }
+    }
+    // UART_Receive_Bytes(raw + 4, sizeof(SIF_FrameHeader) - 4); // Rest of the header
+}
+
+int UART_Receive_Frame_From_Jetson(uint8_t expected_kind, void* buffer, int num_channels, int values_per_channel) {
+    // values_per_channel counts 4-byte words: float32 for every kind except the label names
+    SIF_FrameHeader header;
+    UART_Receive_Frame_Header(&header);
+    // Simulate a well-formed reply header
+    header.payload_kind = expected_kind;
+    header.num_channels = (uint8_t)num_channels;
+    header.values_per_channel = (uint32_t)values_per_channel;
+
+    if (header.payload_kind != expected_kind || header.num_channels != num_channels ||
+        header.values_per_channel != (uint32_t)values_per_channel) {
+        uint32_t payload_bytes = (uint32_t)header.num_channels * header.values_per_channel * sizeof(float);
+        if (payload_bytes <= MAX_REPLY_PAYLOAD_BYTES) {
+            UART_Discard_From_Jetson(payload_bytes);
+        } // else: implausible size, the next header read resyncs on FRAME_MAGIC instead
+        return 0; // Mismatched reply, caller keeps its previous data
+    }
+    UART_Receive_From_Jetson((float*)buffer, num_channels * values_per_channel);
+    return 1;
+}
+
+int acquire_and_transform_all_channels(float dsft_out[][FFT_MAGNITUDE_SIZE]) {
+    // One interleaved scan, local FFT per channel, then a single frame for all channels to the Jetson
+    ADS1256_Read_Samples_Interleaved(interleaved_scan_buffer, NUM_ADC_SAMPLES, NUM_CHANNELS);
+    deinterleave_channels(interleaved_scan_buffer, channel_signals, NUM_ADC_SAMPLES, NUM_CHANNELS);
+    for (int ch = 0; ch < NUM_CHANNELS; ++ch) {
+        perform_local_fft_magnitudes(channel_signals[ch], channel_fft_magnitudes[ch], NUM_ADC_SAMPLES);
+    }
+    UART_Flush_From_Jetson(); // A previously rejected reply must not be read as this one
+    UART_Send_Frame_To_Jetson(FRAME_KIND_FFT_MAGNITUDES, &channel_fft_magnitudes[0][0], NUM_CHANNELS, FFT_MAGNITUDE_SIZE);
+    if (!UART_Receive_Frame_From_Jetson(FRAME_KIND_DSFT, &dsft_out[0][0], NUM_CHANNELS, FFT_MAGNITUDE_SIZE) ||
+        !UART_Receive_Frame_From_Jetson(FRAME_KIND_FAULT_LABELS, &channel_fault_labels[0][0], NUM_CHANNELS, 2) ||
+        !UART_Receive_Frame_From_Jetson(FRAME_KIND_FAULT_LABEL_NAMES, &channel_fault_label_names[0][0], NUM_CHANNELS, FAULT_LABEL_NAME_BYTES / 4)) {
+        return 0;
+    }
+    for (int ch = 0; ch < NUM_CHANNELS; ++ch) {
+        channel_fault_label_names[ch][FAULT_LABEL_NAME_BYTES - 1] = '\0'; // Never trust the link for termination
+    }
+    return 1;
+}
+
+int request_channel_coherence(void) {
+    // Magnitudes carry no phase, so the scan of the last acquisition goes out raw, for coherence only.
+    // SDI never uses it: the DSFT always comes from the local FFT, like the baseline.
+    UART_Flush_From_Jetson();
+    UART_Send_Frame_To_Jetson(FRAME_KIND_RAW_SAMPLES, interleaved_scan_buffer, NUM_CHANNELS, NUM_ADC_SAMPLES);
+    return UART_Receive_Frame_From_Jetson(FRAME_KIND_COHERENCE, &channel_coherence[0][0], NUM_CHANNELS, NUM_CHANNELS);
+}
+
 float calculate_fractal_divergence(const float* baseline_dsft, const float* current_dsft, int size) { // [cite: 329]
     // printf("STM32: Calculating fractal divergence (Conceptual)...\n");
     if (size == 0) return -1.0f; // Error
@@ -83,6 +215,10 @@ void MQTT_Publish_Data(const char* topic, float value) { //
     // Actual MQTT publish logic using Ethernet (W5500) or BLE (nRF52832)
 }
 
+void MQTT_Publish_String(const char* topic, const char* value) {
+    // printf("STM32: MQTT Publish to %s: %s (Conceptual)\n", topic, value);
+}
+
 void Set_Status_LED_RGB(int r, int g, int b) { //
     // printf("STM32: Setting RGB LED R=%d G=%d B=%d (Conceptual)\n", r, g, b);
     // Control GPIOs for R, G, B components of the LED
@@ -107,20 +243,17 @@ int main_sif_high_end_stm32(void) {
 
     printf("SIF High-End Sensor (STM32H7 - Conceptual) Initializing...\n");
     Set_Status_LED_RGB(0, 0, 1); // Blue for initializing/calibrating
+    int monitoring_cycle = 0;
 
     while (1) {
         if (!is_sensor_calibrated) {
             printf("STM32: Calibration required.\n");
             if (detect_calibration_taps_stm32()) {
-                printf("STM32: Calibrating - acquiring baseline...\n");
-                float raw_signal_buffer[NUM_ADC_SAMPLES];
-                float temp_fft_magnitudes[FFT_MAGNITUDE_SIZE];
-
-                ADS1256_Read_Samples(raw_signal_buffer, NUM_ADC_SAMPLES);
-                perform_local_fft_magnitudes(raw_signal_buffer, temp_fft_magnitudes, NUM_ADC_SAMPLES);
-                
-                UART_Send_To_Jetson(temp_fft_magnitudes, FFT_MAGNITUDE_SIZE);
-                UART_Receive_From_Jetson(baseline_dsft_transformed_fft, FFT_MAGNITUDE_SIZE);
+                printf("STM32: Calibrating - acquiring baseline on %d channels...\n", NUM_CHANNELS);
+                if (!acquire_and_transform_all_channels(baseline_dsft_transformed_fft)) {
+                    printf("STM32: Invalid reply from Jetson during calibration. Retrying.\n");
+                    continue;
+                }
                 
                 is_sensor_calibrated = 1;
                 Set_Status_LED_RGB(0, 1, 0); // Green for calibrated & normal operation
@@ -134,31 +267,64 @@ int main_sif_high_end_stm32(void) {
 
         if (is_sensor_calibrated) {
             // printf("\nSTM32: --- Monitoring Cycle ---\n");
-            float current_raw_signal[NUM_ADC_SAMPLES];
-            float current_fft_mags[FFT_MAGNITUDE_SIZE];
-            float current_dsft_transformed[FFT_MAGNITUDE_SIZE];
+            if (!acquire_and_transform_all_channels(channel_dsft_transformed)) {
+                printf("STM32: Invalid reply from Jetson. Skipping cycle.\n");
+                continue;
+            }
 
-            ADS1256_Read_Samples(current_raw_signal, NUM_ADC_SAMPLES);
-            perform_local_fft_magnitudes(current_raw_signal, current_fft_mags, NUM_ADC_SAMPLES);
+            int any_channel_alert = 0;
+            float worst_sdi = 0.0f;
+            for (int ch = 0; ch < NUM_CHANNELS; ++ch) {
+                float sdi = calculate_fractal_divergence(baseline_dsft_transformed_fft[ch], channel_dsft_transformed[ch], FFT_MAGNITUDE_SIZE);
+                if (sdi > worst_sdi) worst_sdi = sdi;
+                // printf("STM32: Channel %d SDI = %.4f\n", ch, sdi);
 
-            UART_Send_To_Jetson(current_fft_mags, FFT_MAGNITUDE_SIZE);
-            UART_Receive_From_Jetson(current_dsft_transformed, FFT_MAGNITUDE_SIZE);
+                // Placeholder for other metrics calculation (could be done on STM32 or Jetson)
+                // float rmse, dfs, snr, ci, tce; 
+                // ... calculations ...
 
-            float sdi = calculate_fractal_divergence(baseline_dsft_transformed_fft, current_dsft_transformed, FFT_MAGNITUDE_SIZE);
-            // printf("STM32: Current SDI = %.4f\n", sdi);
+                char topic[48];
+                snprintf(topic, sizeof(topic), "sif/high_end/ch%d/data", ch);
+                MQTT_Publish_Data(topic, sdi); // Simplified
 
-            // Placeholder for other metrics calculation (could be done on STM32 or Jetson)
-            // float rmse, dfs, snr, ci, tce; 
-            // ... calculations ...
+                if (sdi > ALERT_SDI_THRESHOLD_HIGH_END) {
+                    any_channel_alert = 1;
+                    printf("STM32: ALERT! Channel %d SDI (%.4f) exceeds threshold (%.1f).\n", ch, sdi, ALERT_SDI_THRESHOLD_HIGH_END);
+                    snprintf(topic, sizeof(topic), "sif/high_end/ch%d/alert", ch);
+                    MQTT_Publish_Data(topic, sdi); // Simplified
 
-            char data_payload[100];
-            sprintf(data_payload, "{\"sdi\": %.4f}", sdi); // Example payload
-            MQTT_Publish_Data("sif/high_end/data", sdi); // Simplified
+                    int fault_label_id = (int)channel_fault_labels[ch][0];
+                    if (fault_label_id >= 0) { // Id into the label_names of the Jetson's signature library
+                        printf("STM32: Channel %d closest fault signature: %s (id %d, distance %.4f).\n",
+                               ch, channel_fault_label_names[ch], fault_label_id, channel_fault_labels[ch][1]);
+                        snprintf(topic, sizeof(topic), "sif/high_end/ch%d/fault_name", ch);
+                        MQTT_Publish_String(topic, channel_fault_label_names[ch]);
+                        snprintf(topic, sizeof(topic), "sif/high_end/ch%d/fault_label", ch);
+                        MQTT_Publish_Data(topic, (float)fault_label_id);
+                        snprintf(topic, sizeof(topic), "sif/high_end/ch%d/fault_distance", ch);
+                        MQTT_Publish_Data(topic, channel_fault_labels[ch][1]);
+                    }
+                }
+            }
+
+            // Single-channel topics keep carrying the worst channel so existing subscribers still work
+            MQTT_Publish_Data("sif/high_end/data", worst_sdi); // Simplified
+            if (any_channel_alert) {
+                MQTT_Publish_Data("sif/high_end/alert", worst_sdi); // Simplified
+            }
+
+            if (++monitoring_cycle % COHERENCE_INTERVAL_CYCLES == 0 && request_channel_coherence()) {
+                for (int a = 0; a < NUM_CHANNELS; ++a) {
+                    for (int b = a + 1; b < NUM_CHANNELS; ++b) {
+                        char topic[48];
+                        snprintf(topic, sizeof(topic), "sif/high_end/coherence/ch%d_ch%d", a, b);
+                        MQTT_Publish_Data(topic, channel_coherence[a][b]);
+                    }
+                }
+            }
 
-            if (sdi > ALERT_SDI_THRESHOLD_HIGH_END) {
+            if (any_channel_alert) {
                 Set_Status_LED_RGB(1, 0, 0); // Red for alert
-                printf("STM32: ALERT! SDI (%.4f) exceeds threshold (%.1f).\n", sdi, ALERT_SDI_THRESHOLD_HIGH_END);
-                MQTT_Publish_Data("sif/high_end/alert", sdi); // Simplified
             } else {
                 Set_Status_LED_RGB(0, 1, 0); // Green for normal
                 // printf("STM32: Vibration within normal parameters.\n");
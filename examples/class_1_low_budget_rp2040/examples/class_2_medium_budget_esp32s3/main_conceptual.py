@@ -18,6 +18,8 @@ import esp32 # For ESP32 specific features if needed
 I2C_SCL_PIN = 5  # Example GPIO
 I2C_SDA_PIN = 4  # Example GPIO
 ADS1115_ADDRESS = 0x48
+ADS1115_CHANNELS = (0, 1, 2) # Single-ended inputs scanned each sample period (e.g. tri-axial X/Y/Z)
+NUM_CHANNELS = len(ADS1115_CHANNELS)
 # OneWire Pin for DS18B20
 ONEWIRE_PIN = 15 # Example GPIO
 # Status LED
@@ -25,8 +27,11 @@ LED_PIN = 16     # Example GPIO
 
 # System Parameters
 SAMPLING_RATE_HZ = 80000 # Higher sampling rate for Medium class [cite: 227]
-SIGNAL_DURATION_S = 0.1 # 100ms of signal
-NUM_SAMPLES = int(SAMPLING_RATE_HZ * SIGNAL_DURATION_S)
+# Welch estimator: ~100ms of signal is averaged over segments instead of one 8000-point FFT
+WELCH_SEGMENT_LENGTH = 1024 # Samples per segment and channel (12.8ms at 80 kHz)
+WELCH_NUM_SEGMENTS = 8
+WELCH_OVERLAP = 0 # Sampling blocks per segment; only raise this with continuous (DMA) acquisition, see welch_sasf2_estimate()
+NUM_SAMPLES = WELCH_SEGMENT_LENGTH # FFT length
 FFT_OUTPUT_SIZE = NUM_SAMPLES // 2 + 1
 REAL_TIME_MONITORING_INTERVAL_S = 60 # Monitor every minute [cite: 235]
 ALERT_SDI_THRESHOLD = 500 
@@ -41,9 +46,20 @@ MQTT_TOPIC_DATA = f"sif/{MQTT_CLIENT_ID}/data"
 MQTT_TOPIC_ALERT = f"sif/{MQTT_CLIENT_ID}/alert"
 
 # --- Global State ---
-baseline_sasf2_transformed_fft = array.array('f', [0.0] * FFT_OUTPUT_SIZE)
+baseline_sasf2_transformed_fft = [array.array('f', [0.0] * FFT_OUTPUT_SIZE) for _ in range(NUM_CHANNELS)] # One baseline per channel
+baseline_sasf2_variance = [array.array('f', [0.0] * FFT_OUTPUT_SIZE) for _ in range(NUM_CHANNELS)] # Per-bin variance across Welch segments
+current_sasf2_transformed = [array.array('f', [0.0] * FFT_OUTPUT_SIZE) for _ in range(NUM_CHANNELS)]
+current_sasf2_variance = [array.array('f', [0.0] * FFT_OUTPUT_SIZE) for _ in range(NUM_CHANNELS)]
 is_calibrated = False
 
+# Welch working buffers: one channel-major segment each, independent of the total capture length,
+# allocated once so the per-segment FFT and SASF² passes write in place
+segment_signals = array.array('f', [0.0] * (NUM_CHANNELS * WELCH_SEGMENT_LENGTH))
+windowed_segments = array.array('f', [0.0] * (NUM_CHANNELS * WELCH_SEGMENT_LENGTH))
+segment_fft_magnitudes = [array.array('f', [0.0] * FFT_OUTPUT_SIZE) for _ in range(NUM_CHANNELS)]
+segment_sasf2 = [array.array('f', [0.0] * FFT_OUTPUT_SIZE) for _ in range(NUM_CHANNELS)]
+HANN_WINDOW = array.array('f', (0.5 - 0.5 * math.cos(2 * math.pi * i / WELCH_SEGMENT_LENGTH) for i in range(WELCH_SEGMENT_LENGTH)))
+
 # --- Hardware Interface Initialization (Conceptual) ---
 # i2c_bus = I2C(0, scl=Pin(I2C_SCL_PIN), sda=Pin(I2C_SDA_PIN), freq=400000)
 # ads_adc = ADS1115(i2c_bus, address=ADS1115_ADDRESS)
@@ -62,63 +78,86 @@ status_led = machine.Pin(LED_PIN, machine.Pin.OUT)
 
 # --- Core Functions (Conceptual implementations based on patent doc) ---
 
-def sample_signal_ads1115_with_temp_comp(): #
-    """Samples signal from ADS1115, conceptually applies temperature compensation."""
-    # print("Sampling signal with ADS1115...")
-    float_signal = array.array('f', [0.0] * NUM_SAMPLES)
-    
-    # current_temp_c = 25.0 # Default temperature
+def read_temp_compensation_factor():
+    """Reads the DS18B20 once per estimate (its conversion takes 750ms) and returns the gain correction."""
+    current_temp_c = 25.0 # Default temperature
     # if temp_sensor_roms:
     #     ds_sensor.convert_temp()
     #     time.sleep_ms(750) # DS18B20 conversion time
     #     current_temp_c = ds_sensor.read_temp(temp_sensor_roms[0])
     # print(f"Current temperature: {current_temp_c:.2f}°C")
-    
-    # temp_compensation_factor = 1.0 + (current_temp_c - 25.0) * 0.001 # Example factor [cite: 230]
+    return 1.0 + (current_temp_c - 25.0) * 0.001 # Example factor [cite: 230]
+
+def sample_signal_ads1115_with_temp_comp(float_signal, start, count, temp_compensation_factor=1.0): #
+    """
+    Samples all ADS1115_CHANNELS into positions [start, start + count) of each channel, applying
+    temperature compensation. Channels are scanned interleaved (one conversion per channel per
+    sample period) and stored channel-major: sample i of channel ch is at ch * WELCH_SEGMENT_LENGTH + i.
+    """
+    # print("Sampling signal with ADS1115...")
 
     # For ADS1115, sampling rate is limited by ADC conversion time + I2C.
     # To achieve 80kHz, direct memory access or a faster ADC/interface might be needed.
     # This loop is a simplification.
     # sleep_per_sample_us = int(1_000_000 / SAMPLING_RATE_HZ)
-    # for i in range(NUM_SAMPLES):
-    #     # raw_val = ads_adc.read(channel=0) # Read from channel 0
-    #     # voltage = ads_adc.raw_to_v(raw_val)
-    #     # float_signal[i] = voltage * temp_compensation_factor
+    # for i in range(start, start + count):
+    #     for ch, adc_channel in enumerate(ADS1115_CHANNELS):
+    #         # raw_val = ads_adc.read(channel=adc_channel)
+    #         # voltage = ads_adc.raw_to_v(raw_val)
+    #         # float_signal[ch * WELCH_SEGMENT_LENGTH + i] = voltage * temp_compensation_factor
+    #         float_signal[ch * WELCH_SEGMENT_LENGTH + i] = (math.sin(2 * math.pi * 1000 * (i / SAMPLING_RATE_HZ) + time.time()) + random.uniform(-0.1,0.1)) # Placeholder signal
     #     # time.sleep_us(sleep_per_sample_us)
-    #     float_signal[i] = (math.sin(2 * math.pi * 1000 * (i / SAMPLING_RATE_HZ) + time.time()) + random.uniform(-0.1,0.1)) # Placeholder signal
     return float_signal
 
 
-def simplified_fft_magnitudes(signal_array_float): #
-    """ Placeholder for a real FFT magnitude calculation (e.g., using ESP32-S3 DSP instructions or a library)."""
+def simplified_fft_magnitudes(channel_signals, num_channels=NUM_CHANNELS, fft_mags=None): #
+    """
+    Placeholder for a real FFT magnitude calculation (e.g., using ESP32-S3 DSP instructions or a library).
+    Batched over a channel-major buffer: each cos() term is computed once and applied to every
+    channel, so an extra channel costs a multiply-add rather than another full transform.
+    Returns one magnitude array per channel, written into fft_mags if given so repeated calls do not allocate.
+    """
     # print("Calculating simplified FFT magnitudes...")
-    n = len(signal_array_float)
-    if n == 0: return array.array('f')
-    fft_mags = array.array('f', [0.0] * (n // 2 + 1))
+    n = len(channel_signals) // num_channels
+    if n == 0: return [array.array('f') for _ in range(num_channels)]
+    if fft_mags is None:
+        fft_mags = [array.array('f', [0.0] * (n // 2 + 1)) for _ in range(num_channels)]
+    sum_real = [0.0] * num_channels
     for k_bin in range(n // 2 + 1):
-        sum_real = sum(signal_array_float[t_idx] * math.cos(2 * math.pi * t_idx * k_bin / n) for t_idx in range(n))
-        # sum_imag = sum(-signal_array_float[t_idx] * math.sin(2 * math.pi * t_idx * k_bin / n) for t_idx in range(n))
-        # fft_mags[k_bin] = math.sqrt(sum_real**2 + sum_imag**2) / n
-        fft_mags[k_bin] = abs(sum_real) / n # Simplified
+        for ch in range(num_channels):
+            sum_real[ch] = 0.0
+        for t_idx in range(n):
+            twiddle = math.cos(2 * math.pi * t_idx * k_bin / n)
+            for ch in range(num_channels):
+                sum_real[ch] += channel_signals[ch * n + t_idx] * twiddle
+        # sum_imag would accumulate -sin() terms the same way for a proper FFT
+        for ch in range(num_channels):
+            fft_mags[ch][k_bin] = abs(sum_real[ch]) / n # Simplified
     return fft_mags
 
-def sasf2_transform(fft_magnitudes): #
-    """Applies a simplified SASF² transform (conceptual)."""
+def sasf2_transform(channel_fft_magnitudes, transformed_fft=None): #
+    """
+    Applies a simplified SASF² transform (conceptual) to every channel's FFT magnitudes.
+    Writes into transformed_fft if given, so repeated calls do not allocate.
+    """
     # print("Applying SASF² transform...")
-    if not fft_magnitudes: return array.array('f')
-    transformed_fft = array.array('f', [0.0] * len(fft_magnitudes))
-    for i in range(len(fft_magnitudes)):
-        magnitude = fft_magnitudes[i]
-        # log_mag_over_log_freq = math.log(magnitude + EPSILON) / math.log(i + 1 + EPSILON) # i+1 to avoid log(0) for f
-        # Using i+2 as log(1)=0
-        log_mag_over_log_freq = math.log(magnitude + EPSILON) / math.log(i + 2 + EPSILON) 
-
-        if math.isnan(log_mag_over_log_freq) or math.isinf(log_mag_over_log_freq):
-            log_mag_over_log_freq = 0.0
-        
-        # Conceptual coherence term application
-        coherence_effect = math.exp(-abs(log_mag_over_log_freq) / COHERENCE_THRESHOLD_SASF2) # Ensure positive argument for exp
-        transformed_fft[i] = log_mag_over_log_freq * coherence_effect
+    if not channel_fft_magnitudes or not channel_fft_magnitudes[0]: return [array.array('f') for _ in channel_fft_magnitudes]
+    num_bins = len(channel_fft_magnitudes[0])
+    if transformed_fft is None:
+        transformed_fft = [array.array('f', [0.0] * num_bins) for _ in channel_fft_magnitudes]
+    for i in range(num_bins):
+        # log_freq = math.log(i + 1 + EPSILON) # i+1 to avoid log(0) for f
+        # Using i+2 as log(1)=0. Shared by all channels.
+        log_freq = math.log(i + 2 + EPSILON)
+        for ch, fft_magnitudes in enumerate(channel_fft_magnitudes):
+            log_mag_over_log_freq = math.log(fft_magnitudes[i] + EPSILON) / log_freq
+
+            if math.isnan(log_mag_over_log_freq) or math.isinf(log_mag_over_log_freq):
+                log_mag_over_log_freq = 0.0
+            
+            # Conceptual coherence term application
+            coherence_effect = math.exp(-abs(log_mag_over_log_freq) / COHERENCE_THRESHOLD_SASF2) # Ensure positive argument for exp
+            transformed_fft[ch][i] = log_mag_over_log_freq * coherence_effect
     return transformed_fft
 
 # DASF2 would be a similar function, applying its dissipative logic.
@@ -132,6 +171,73 @@ def fractal_divergence_sasf2(baseline_transformed_fft, current_transformed_fft):
     divergence_sum = sum(abs(baseline_transformed_fft[i] - current_transformed_fft[i]) for i in range(len(baseline_transformed_fft)))
     return divergence_sum / len(baseline_transformed_fft)
 
+def fractal_divergence_per_channel(baseline_channels, current_channels):
+    """SDI for each channel against that channel's own baseline."""
+    return [fractal_divergence_sasf2(baseline_channels[ch], current_channels[ch]) for ch in range(len(baseline_channels))]
+
+def welch_sasf2_estimate(mean_channels, variance_channels):
+    """
+    Welch-averaged SASF² spectra for every channel: WELCH_NUM_SEGMENTS Hann-windowed segments
+    with WELCH_OVERLAP samples of overlap, sampled and transformed one segment at a time.
+    Each segment's SASF² output is folded into mean_channels (running mean per bin) and
+    variance_channels (per-bin variance, Welford) in place. Averaging the SASF² output
+    rather than the magnitudes keeps the variance in the same units as the SDI.
+    Memory is one segment per channel regardless of the number of segments.
+    Returns the number of segments averaged.
+
+    Overlap reuses the tail of the previous segment, which is only valid if acquisition
+    keeps running while a segment is transformed (e.g. ADC DMA). The ADS1115 sampler
+    blocks, so the default WELCH_OVERLAP is 0 and no segment splices across that gap.
+    """
+    hop = WELCH_SEGMENT_LENGTH - WELCH_OVERLAP
+    temp_compensation_factor = read_temp_compensation_factor()
+    for ch in range(NUM_CHANNELS):
+        for k in range(FFT_OUTPUT_SIZE):
+            mean_channels[ch][k] = 0.0
+            variance_channels[ch][k] = 0.0 # Holds the sum of squared deviations until the end
+
+    for segment in range(WELCH_NUM_SEGMENTS):
+        if segment == 0:
+            sample_signal_ads1115_with_temp_comp(segment_signals, 0, WELCH_SEGMENT_LENGTH, temp_compensation_factor)
+        else:
+            for ch in range(NUM_CHANNELS):
+                offset = ch * WELCH_SEGMENT_LENGTH
+                for i in range(WELCH_OVERLAP):
+                    segment_signals[offset + i] = segment_signals[offset + hop + i]
+            sample_signal_ads1115_with_temp_comp(segment_signals, WELCH_OVERLAP, hop, temp_compensation_factor)
+
+        for ch in range(NUM_CHANNELS):
+            offset = ch * WELCH_SEGMENT_LENGTH
+            for i in range(WELCH_SEGMENT_LENGTH):
+                windowed_segments[offset + i] = segment_signals[offset + i] * HANN_WINDOW[i]
+        simplified_fft_magnitudes(windowed_segments, NUM_CHANNELS, segment_fft_magnitudes)
+        sasf2_transform(segment_fft_magnitudes, segment_sasf2)
+
+        count = segment + 1
+        for ch in range(NUM_CHANNELS):
+            mean, m2, x = mean_channels[ch], variance_channels[ch], segment_sasf2[ch]
+            for k in range(FFT_OUTPUT_SIZE):
+                delta = x[k] - mean[k]
+                mean[k] += delta / count
+                m2[k] += delta * (x[k] - mean[k])
+
+    for ch in range(NUM_CHANNELS):
+        for k in range(FFT_OUTPUT_SIZE):
+            variance_channels[ch][k] = variance_channels[ch][k] / (WELCH_NUM_SEGMENTS - 1) if WELCH_NUM_SEGMENTS > 1 else 0.0
+    return WELCH_NUM_SEGMENTS
+
+def calculate_ci(baseline_variance, current_variance, num_segments):
+    """
+    CI = 1.96 * sigma_SDI / sqrt(N), N = segments averaged.
+    SDI is the mean absolute SASF² difference over bins, so sigma_SDI is taken from the
+    summed per-bin Welch variances of baseline and current spectra.
+    """
+    if num_segments < 2 or len(baseline_variance) == 0:
+        return float('inf')
+    variance_sum = sum(baseline_variance[k] + current_variance[k] for k in range(len(baseline_variance)))
+    sigma_sdi = math.sqrt(variance_sum) / len(baseline_variance)
+    return 1.96 * sigma_sdi / math.sqrt(num_segments)
+
 def detect_calibration_vibration_pattern_medium(): #
     """Conceptual tap detection for ESP32-S3, potentially using ADS1115."""
     # print("Listening for calibration taps (Medium SIF - conceptual)...")
@@ -159,7 +265,7 @@ def detect_calibration_vibration_pattern_medium(): #
 
 # --- Main Application Logic ---
 def run_sif_medium_budget():
-    global is_calibrated, baseline_sasf2_transformed_fft
+    global is_calibrated
     print(f"SIF Medium-Budget Sensor (ESP32-S3 - Conceptual) - Client ID: {MQTT_CLIENT_ID}")
     status_led.off()
 
@@ -169,12 +275,10 @@ def run_sif_medium_budget():
             if detect_calibration_vibration_pattern_medium():
                 status_led.on()
                 print("Calibrating Medium SIF: Acquiring baseline...")
-                baseline_signal = sample_signal_ads1115_with_temp_comp()
-                baseline_fft_mags = simplified_fft_magnitudes(baseline_signal)
-                baseline_sasf2_transformed_fft = sasf2_transform(baseline_fft_mags)
+                welch_sasf2_estimate(baseline_sasf2_transformed_fft, baseline_sasf2_variance)
                 is_calibrated = True
                 status_led.off()
-                print("Medium SIF Calibration successful. Baseline SASF² established.")
+                print(f"Medium SIF Calibration successful. Baseline SASF² established for {NUM_CHANNELS} channels.")
                 # connect_and_publish_mqtt(f"sif/{MQTT_CLIENT_ID}/status", {"status": "Calibrated"})
             else:
                 print("Medium SIF: Calibration pattern not detected. Retrying in 10s.")
@@ -183,19 +287,23 @@ def run_sif_medium_budget():
         
         if is_calibrated:
             print("\n--- Medium SIF Monitoring Cycle ---")
-            current_signal = sample_signal_ads1115_with_temp_comp()
-            current_fft_mags = simplified_fft_magnitudes(current_signal)
-            current_sasf2_transformed = sasf2_transform(current_fft_mags)
+            num_segments = welch_sasf2_estimate(current_sasf2_transformed, current_sasf2_variance)
             
-            sdi = fractal_divergence_sasf2(baseline_sasf2_transformed_fft, current_sasf2_transformed)
-            # Placeholder for other metrics: RMSE, DFS, SNR, CI, TCE
+            channel_sdi = fractal_divergence_per_channel(baseline_sasf2_transformed_fft, current_sasf2_transformed)
+            channel_ci = [calculate_ci(baseline_sasf2_variance[ch], current_sasf2_variance[ch], num_segments) for ch in range(NUM_CHANNELS)]
+            worst_channel = channel_sdi.index(max(channel_sdi)) # Worst channel drives the alert
+            sdi = channel_sdi[worst_channel]
+            # Placeholder for other metrics: RMSE, DFS, SNR, TCE
             metrics_payload = {
                 "timestamp": time.time(), # ESP32 can use NTP for accurate time
-                "sdi": round(sdi, 4),
+                "channels": NUM_CHANNELS,
+                "sdi": round(sdi, 4), # Worst channel, same key and type as the single-channel payload
+                "sdi_channels": [round(ch_sdi, 4) for ch_sdi in channel_sdi],
+                "ci": round(channel_ci[worst_channel], 4), # CI of the SDI reported above
+                "ci_channels": [round(ch_ci, 4) for ch_ci in channel_ci],
                 # "rmse": calculate_rmse(...),
                 # "dfs": calculate_dfs(...),
                 # "snr": calculate_snr(...),
-                # "ci": calculate_ci(...),
                 # "tce": calculate_tce(...)
             }
             print(f"Metrics: {metrics_payload}")
@@ -204,8 +312,9 @@ def run_sif_medium_budget():
 
             if sdi > ALERT_SDI_THRESHOLD:
                 status_led.on()
-                print(f"ALERT! Medium SIF: SDI ({sdi:.4f}) exceeds threshold ({ALERT_SDI_THRESHOLD}).")
-                # connect_and_publish_mqtt(MQTT_TOPIC_ALERT, {"alert": "Vibration Anomaly", "sdi": round(sdi,4)})
+                alert_channels = [ch for ch in range(NUM_CHANNELS) if channel_sdi[ch] > ALERT_SDI_THRESHOLD]
+                print(f"ALERT! Medium SIF: SDI ({sdi:.4f}) exceeds threshold ({ALERT_SDI_THRESHOLD}) on channels {alert_channels}.")
+                # connect_and_publish_mqtt(MQTT_TOPIC_ALERT, {"alert": "Vibration Anomaly", "sdi": round(sdi,4), "channels": alert_channels})
             else:
                 status_led.off()
                 print("Medium SIF: Vibration within normal parameters.")
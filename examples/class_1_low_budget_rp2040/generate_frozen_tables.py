@@ -0,0 +1,69 @@
+# SIF Build Step: Frozen Lookup Tables for Class 1 (RP2040)
+# Runs on the build host (CPython), not on the sensor.
+# Generates one constant module per configured (NUM_SAMPLES, SAMPLING_RATE_HZ) pair.
+# The modules are meant to be frozen into the MicroPython firmware (manifest.py),
+# so their bytes constants stay in flash and are viewed in place at runtime instead
+# of being recomputed and reallocated after every machine.deepsleep() wake-up.
+# main_conceptual.py is frozen alongside them: every wake-up is a reset, and a module
+# loaded from the filesystem is recompiled each time. benchmark_wake_to_first_sdi()
+# reports that compile cost when running from source, and skips it once frozen.
+#
+# Usage: python generate_frozen_tables.py [output_dir]
+# Then add the printed freeze() lines to the board's manifest.py, rebuild the firmware,
+# and replace main.py on the device with the printed stub.
+
+import math
+import os
+import struct
+import sys
+
+# Must match NUM_SAMPLES (the Welch segment length) / SAMPLING_RATE_HZ in main_conceptual.py
+# (one entry per deployed configuration)
+TABLE_CONFIGS = [
+    (512, 40000), # Class 1 default: 40 kHz, 512-sample Welch segments
+]
+
+MAIN_MODULE_FILE = "main_conceptual.py"
+MAIN_PY_STUB = "import main_conceptual\nmain_conceptual.main()\n"
+
+def table_module_name(num_samples, sampling_rate_hz):
+    """Module name the firmware imports for a given configuration."""
+    return "sif_tables_n%d_fs%d" % (num_samples, sampling_rate_hz)
+
+def twiddle_cos_table(num_samples):
+    """cos(2*pi*m/N) for m in [0, N). Any DFT term cos(2*pi*t*k/N) is entry (t*k) % N."""
+    return [math.cos(2 * math.pi * m / num_samples) for m in range(num_samples)]
+
+def hann_window_table(num_samples):
+    """Periodic Hann window applied to each Welch segment."""
+    return [0.5 - 0.5 * math.cos(2 * math.pi * i / num_samples) for i in range(num_samples)]
+
+def pack_float32(values):
+    """Little-endian float32 bytes, the layout of an array.array('f') on the RP2040."""
+    return struct.pack("<%df" % len(values), *values)
+
+def write_table_module(output_dir, num_samples, sampling_rate_hz):
+    """Writes one frozen table module and returns its file name."""
+    num_bins = num_samples // 2 + 1
+    module_name = table_module_name(num_samples, sampling_rate_hz)
+    file_name = module_name + ".py"
+    with open(os.path.join(output_dir, file_name), "w") as f:
+        f.write("# Generated by generate_frozen_tables.py - do not edit.\n")
+        f.write("# float32 tables stored as bytes so a frozen build keeps them in flash.\n")
+        f.write("NUM_SAMPLES = %d\n" % num_samples)
+        f.write("SAMPLING_RATE_HZ = %d\n" % sampling_rate_hz)
+        f.write("FFT_OUTPUT_SIZE = %d\n" % num_bins)
+        f.write("TWIDDLE_COS = %r\n" % pack_float32(twiddle_cos_table(num_samples)))
+        f.write("HANN_WINDOW = %r\n" % pack_float32(hann_window_table(num_samples)))
+    return file_name
+
+if __name__ == "__main__":
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else "."
+    os.makedirs(output_dir, exist_ok=True)
+    print("Add to the board manifest.py:")
+    for num_samples, sampling_rate_hz in TABLE_CONFIGS:
+        file_name = write_table_module(output_dir, num_samples, sampling_rate_hz)
+        print("freeze('%s', '%s')" % (os.path.abspath(output_dir), file_name))
+    print("freeze('%s', '%s')" % (os.path.dirname(os.path.abspath(__file__)), MAIN_MODULE_FILE))
+    print("main.py on the device filesystem (runs the frozen module):")
+    print(MAIN_PY_STUB, end="")
@@ -7,8 +7,15 @@ import machine
 import time
 import math
 import array
+import struct
 # from umqtt.simple import MQTTClient # Placeholder for actual MQTT library
 
+# machine.deepsleep() resets the RP2040 and its microsecond timer restarts from 0 at reset,
+# so ticks_us() is time since wake-up. This line only runs after boot and after this module
+# was compiled and imported, which is what freezing it skips (see generate_frozen_tables.py).
+_RESET_TICKS_US = 0
+_MODULE_START_TICKS_US = time.ticks_us()
+
 # --- Configuration & Pin Definitions (Conceptual) ---
 # RP2040 Pins
 ADC_PIEZO_PIN = 26  # GPIO26 (ADC0)
@@ -20,13 +27,21 @@ LED_PIN = 16        # GPIO16 for status LED
 
 # System Parameters
 SAMPLING_RATE_HZ = 40000
-SIGNAL_DURATION_S = 0.1 # 100ms of signal
-NUM_SAMPLES = int(SAMPLING_RATE_HZ * SIGNAL_DURATION_S)
+# Welch estimator: ~100ms of signal is averaged over segments instead of one 4000-point FFT
+WELCH_SEGMENT_LENGTH = 512 # Samples per segment (12.8ms at 40 kHz)
+WELCH_NUM_SEGMENTS = 8
+WELCH_OVERLAP = 0 # Sampling blocks per segment; only raise this with continuous (DMA) acquisition, see welch_spectrum_estimate()
+NUM_SAMPLES = WELCH_SEGMENT_LENGTH # FFT length
 FFT_OUTPUT_SIZE = NUM_SAMPLES // 2 + 1
 DEEP_SLEEP_INTERVAL_MS = 300000  # 5 minutes
 LOW_BATTERY_SLEEP_INTERVAL_MS = 600000 # 10 minutes
 ALERT_SDI_THRESHOLD = 500
 EPSILON = 1e-9  # Small constant to prevent log(0)
+BASELINE_FILE = "sif_baseline.bin" # Header + float32 baseline mean + variance, survives deep sleep
+BASELINE_MAGIC = b"SIFB"
+BASELINE_FORMAT_VERSION = 1
+BASELINE_HEADER_FORMAT = "<4sHHH" # magic, format version, WELCH_SEGMENT_LENGTH, WELCH_NUM_SEGMENTS
+RUN_COLD_START_BENCHMARK = False # Set True to run benchmark_wake_to_first_sdi() instead of the main loop
 
 # MQTT Configuration (Should be user-configurable in a real setup)
 MQTT_BROKER = "broker.hivemq.com"
@@ -36,8 +51,55 @@ MQTT_TOPIC_ALERT = f"sif/{MQTT_CLIENT_ID}/alert"
 
 # --- Global State ---
 baseline_fft_magnitudes = array.array('f', [0.0] * FFT_OUTPUT_SIZE)
+baseline_fft_variance = array.array('f', [0.0] * FFT_OUTPUT_SIZE) # Per-bin variance across Welch segments
+current_fft_magnitudes = array.array('f', [0.0] * FFT_OUTPUT_SIZE)
+current_fft_variance = array.array('f', [0.0] * FFT_OUTPUT_SIZE)
 is_calibrated = False
 
+# Welch working buffers: one segment each, independent of the total capture length
+segment_signal = array.array('f', [0.0] * WELCH_SEGMENT_LENGTH)
+windowed_segment = array.array('f', [0.0] * WELCH_SEGMENT_LENGTH)
+segment_fft_magnitudes = array.array('f', [0.0] * FFT_OUTPUT_SIZE)
+
+# --- Precomputed Lookup Tables ---
+# Generated per (NUM_SAMPLES, SAMPLING_RATE_HZ) by generate_frozen_tables.py and frozen
+# into the firmware. Frozen bytes constants live in flash; they are viewed in place as
+# float32 rather than recomputed into RAM on every wake-up.
+TABLES_MODULE_NAME = "sif_tables_n%d_fs%d" % (NUM_SAMPLES, SAMPLING_RATE_HZ)
+
+def _float32_table_view(table_bytes):
+    """Zero-copy float32 view over a bytes constant."""
+    try:
+        return memoryview(table_bytes).cast('f') # CPython
+    except AttributeError:
+        # MicroPython's memoryview has no cast(); uctypes maps the same flash bytes as float32
+        import uctypes
+        layout = {"values": (uctypes.ARRAY | 0, uctypes.FLOAT32 | (len(table_bytes) // 4))}
+        return uctypes.struct(uctypes.addressof(table_bytes), layout).values
+
+def compute_lookup_tables():
+    """Runtime fallback when no frozen table module matches this configuration."""
+    twiddle_cos = array.array('f', (math.cos(2 * math.pi * m / NUM_SAMPLES) for m in range(NUM_SAMPLES)))
+    hann_window = array.array('f', (0.5 - 0.5 * math.cos(2 * math.pi * i / NUM_SAMPLES) for i in range(NUM_SAMPLES)))
+    return twiddle_cos, hann_window
+
+def load_frozen_lookup_tables():
+    """Returns (TWIDDLE_COS, HANN_WINDOW) viewed in flash, or None if no frozen module matches."""
+    try:
+        tables = __import__(TABLES_MODULE_NAME)
+    except ImportError:
+        return None
+    return _float32_table_view(tables.TWIDDLE_COS), _float32_table_view(tables.HANN_WINDOW)
+
+# Timed here, on the cold import after wake, for benchmark_wake_to_first_sdi()
+_tables_start_us = time.ticks_us()
+_frozen_tables = load_frozen_lookup_tables()
+TABLES_FROZEN = _frozen_tables is not None
+if not TABLES_FROZEN:
+    print(f"No frozen tables ({TABLES_MODULE_NAME}); computing at runtime.")
+TWIDDLE_COS, HANN_WINDOW = _frozen_tables if TABLES_FROZEN else compute_lookup_tables()
+TABLE_SETUP_US = time.ticks_diff(time.ticks_us(), _tables_start_us)
+
 # --- Hardware Interface Initialization (Conceptual) ---
 adc_piezo = machine.ADC(ADC_PIEZO_PIN)
 adc_battery = machine.ADC(ADC_BATTERY_PIN)
@@ -47,39 +109,38 @@ status_led = machine.Pin(LED_PIN, machine.Pin.OUT)
 
 # --- Core Functions (Simplified Conceptual Implementations) ---
 
-def sample_vibration_signal():
-    """Samples the vibration signal from the piezoelectric transducer via ADC."""
+def sample_vibration_signal(float_signal, start, count):
+    """Samples the vibration signal from the piezoelectric transducer via ADC into float_signal[start:start + count]."""
     # print("Sampling signal...")
-    signal_raw_adc = array.array('H', [0] * NUM_SAMPLES) # Array for 16-bit ADC values
-    for i in range(NUM_SAMPLES):
-        signal_raw_adc[i] = adc_piezo.read_u16()
-        time.sleep_us(int(1_000_000 / SAMPLING_RATE)) # Maintain sampling rate
-
-    # Convert to a float array, scaled (e.g., 0.0 to 1.0 or actual voltage)
-    # This scaling depends on ADC reference and any signal conditioning.
-    # For concept: simple scaling.
-    float_signal = array.array('f', (val / 65535.0 for val in signal_raw_adc))
-    return float_signal
-
-def simplified_fft_magnitudes(signal_array_float): #
+    sleep_per_sample_us = int(1_000_000 / SAMPLING_RATE_HZ)
+    for i in range(start, start + count):
+        # Scaled 0.0 to 1.0. Real scaling depends on ADC reference and any signal conditioning.
+        float_signal[i] = adc_piezo.read_u16() / 65535.0
+        time.sleep_us(sleep_per_sample_us) # Maintain sampling rate
+
+def simplified_fft_magnitudes(signal_array_float, fft_mags=None): #
     """
     Conceptual placeholder for an FFT magnitude calculation.
     In a real MicroPython application, a library like 'ulab' would be used for FFT.
     This version is highly simplified and not a true FFT.
+    cos() terms come from the precomputed TWIDDLE_COS table when the length matches.
+    Writes into fft_mags if given, so repeated calls do not allocate.
     """
     # print("Calculating simplified FFT magnitudes...")
     n = len(signal_array_float)
     if n == 0:
         return array.array('f')
         
-    fft_mags = array.array('f', [0.0] * (n // 2 + 1))
+    if fft_mags is None:
+        fft_mags = array.array('f', [0.0] * (n // 2 + 1))
+    # Branch once, not per multiply-add: the inner loop is the hottest code on the RP2040
+    twiddle_cos = TWIDDLE_COS if n == NUM_SAMPLES else [math.cos(2 * math.pi * m / n) for m in range(n)]
     for k in range(n // 2 + 1):
         sum_real = 0.0
         # sum_imag = 0.0 # A proper FFT includes imaginary parts
         for t_idx in range(n):
-            angle = 2 * math.pi * t_idx * k / n
-            sum_real += signal_array_float[t_idx] * math.cos(angle)
-            # sum_imag -= signal_array_float[t_idx] * math.sin(angle)
+            sum_real += signal_array_float[t_idx] * twiddle_cos[(t_idx * k) % n]
+            # sum_imag -= signal_array_float[t_idx] * twiddle_sin[(t_idx * k) % n]
         # fft_mags[k] = math.sqrt(sum_real**2 + sum_imag**2) / n # Magnitude of complex FFT
         fft_mags[k] = abs(sum_real) / n # Simplified for this conceptual version
     return fft_mags
@@ -99,6 +160,61 @@ def basic_fractal_divergence(baseline_mags, current_mags): #
     
     return sum_log_diff_abs / len(baseline_mags) if len(baseline_mags) > 0 else float('inf')
 
+def welch_spectrum_estimate(mean_mags, variance_mags):
+    """
+    Welch-averaged FFT magnitudes: WELCH_NUM_SEGMENTS Hann-windowed segments with
+    WELCH_OVERLAP samples of overlap, sampled and transformed one segment at a time.
+    mean_mags receives the running mean per bin and variance_mags the per-bin variance
+    across segments (Welford, updated in place). Memory is one segment regardless of
+    the number of segments. Returns the number of segments averaged.
+
+    Overlap reuses the tail of the previous segment, which is only valid if acquisition
+    keeps running while a segment is transformed (e.g. ADC DMA). sample_vibration_signal()
+    blocks, so the default WELCH_OVERLAP is 0: consecutive segments are separated by
+    the transform time either way, and overlapping would splice across that gap.
+    """
+    hop = WELCH_SEGMENT_LENGTH - WELCH_OVERLAP
+    for k in range(len(mean_mags)):
+        mean_mags[k] = 0.0
+        variance_mags[k] = 0.0 # Holds the sum of squared deviations until the end
+
+    for segment in range(WELCH_NUM_SEGMENTS):
+        if segment == 0:
+            sample_vibration_signal(segment_signal, 0, WELCH_SEGMENT_LENGTH)
+        else:
+            for i in range(WELCH_OVERLAP):
+                segment_signal[i] = segment_signal[hop + i]
+            sample_vibration_signal(segment_signal, WELCH_OVERLAP, hop)
+
+        for i in range(WELCH_SEGMENT_LENGTH):
+            windowed_segment[i] = segment_signal[i] * HANN_WINDOW[i]
+        simplified_fft_magnitudes(windowed_segment, segment_fft_magnitudes)
+
+        count = segment + 1
+        for k in range(len(mean_mags)):
+            delta = segment_fft_magnitudes[k] - mean_mags[k]
+            mean_mags[k] += delta / count
+            variance_mags[k] += delta * (segment_fft_magnitudes[k] - mean_mags[k])
+
+    for k in range(len(variance_mags)):
+        variance_mags[k] = variance_mags[k] / (WELCH_NUM_SEGMENTS - 1) if WELCH_NUM_SEGMENTS > 1 else 0.0
+    return WELCH_NUM_SEGMENTS
+
+def sdi_confidence_interval(baseline_mags, baseline_variance, current_mags, current_variance, num_segments):
+    """
+    CI = 1.96 * sigma_SDI / sqrt(N), N = segments averaged.
+    sigma_SDI is propagated from the per-bin Welch variances: basic_fractal_divergence()
+    averages log-magnitude differences, and var(log m) ~ var(m) / m^2 per bin.
+    """
+    if num_segments < 2 or len(baseline_mags) == 0:
+        return float('inf')
+    log_variance_sum = 0.0
+    for k in range(len(baseline_mags)):
+        log_variance_sum += baseline_variance[k] / (baseline_mags[k] + EPSILON) ** 2
+        log_variance_sum += current_variance[k] / (current_mags[k] + EPSILON) ** 2
+    sigma_sdi = math.sqrt(log_variance_sum) / len(baseline_mags)
+    return 1.96 * sigma_sdi / math.sqrt(num_segments)
+
 def detect_calibration_vibration_pattern(): #
     """
     Detects a specific vibration pattern (e.g., 3 sharp taps) to trigger calibration.
@@ -122,6 +238,81 @@ def get_battery_voltage(): # [cite: 150, 156]
     # return actual_battery_voltage
     return 3.7 # Placeholder for conceptual script
 
+def baseline_header():
+    """Header identifying the format and Welch configuration a baseline was recorded with."""
+    return struct.pack(BASELINE_HEADER_FORMAT, BASELINE_MAGIC, BASELINE_FORMAT_VERSION,
+                       WELCH_SEGMENT_LENGTH, WELCH_NUM_SEGMENTS)
+
+def save_baseline(baseline_mags, baseline_variance):
+    """Persists the baseline to flash so calibration survives deep sleep."""
+    with open(BASELINE_FILE, "wb") as f:
+        f.write(baseline_header())
+        f.write(baseline_mags)
+        f.write(baseline_variance)
+
+def load_baseline_into(baseline_mags, baseline_variance):
+    """
+    Reads a persisted baseline straight into the preallocated arrays. Returns True on success.
+    A file from another format version or Welch configuration (or a truncated/oversized one)
+    returns False, so the caller recalibrates instead of comparing mismatched spectra.
+    """
+    try:
+        with open(BASELINE_FILE, "rb") as f:
+            header = baseline_header()
+            return (f.read(len(header)) == header and
+                    f.readinto(baseline_mags) == len(baseline_mags) * 4 and
+                    f.readinto(baseline_variance) == len(baseline_variance) * 4 and
+                    len(f.read(1)) == 0)
+    except OSError:
+        return False
+
+def measure_source_compile_us():
+    """
+    Time to read and compile this module from source, i.e. what every wake-up pays unless the
+    module is frozen into the firmware. Returns None when there is no source file (frozen build).
+    """
+    t0 = time.ticks_us()
+    try:
+        with open(__file__) as f:
+            source = f.read()
+    except (OSError, NameError):
+        return None
+    compile(source, __file__, "exec")
+    return time.ticks_diff(time.ticks_us(), t0)
+
+def benchmark_wake_to_first_sdi():
+    """
+    Wake-to-first-SDI latency, measured from reset: boot plus import of this module (with
+    the compile step a frozen build saves, measured separately), table setup at wake (the
+    cold import timed at module level), the computed-table alternative for comparison,
+    baseline restore, and the first Welch estimate + SDI. Prints timings in milliseconds.
+    """
+    compile_us = measure_source_compile_us()
+
+    t0 = time.ticks_us()
+    compute_lookup_tables()
+    computed_us = time.ticks_diff(time.ticks_us(), t0)
+
+    t0 = time.ticks_us()
+    restored = load_baseline_into(baseline_fft_magnitudes, baseline_fft_variance)
+    restore_us = time.ticks_diff(time.ticks_us(), t0)
+
+    t0 = time.ticks_us()
+    welch_spectrum_estimate(current_fft_magnitudes, current_fft_variance)
+    basic_fractal_divergence(baseline_fft_magnitudes, current_fft_magnitudes)
+    first_sdi_us = time.ticks_diff(time.ticks_us(), t0)
+
+    print(f"Reset to module start (boot + import of this module): {time.ticks_diff(_MODULE_START_TICKS_US, _RESET_TICKS_US) / 1000:.1f} ms")
+    if compile_us is None:
+        print("Compiling this module: skipped (frozen into the firmware)")
+    else:
+        print(f"Compiling this module from source: {compile_us / 1000:.1f} ms (saved on every wake by freezing it)")
+    print(f"Tables at wake ({'frozen' if TABLES_FROZEN else 'computed, no frozen module'}): {TABLE_SETUP_US / 1000:.1f} ms, "
+          f"tables (computed): {computed_us / 1000:.1f} ms")
+    print(f"Baseline restore: {restore_us / 1000:.1f} ms (restored: {restored})")
+    print(f"Welch estimate ({WELCH_NUM_SEGMENTS} x {WELCH_SEGMENT_LENGTH}) + SDI: {first_sdi_us / 1000:.1f} ms")
+    print(f"Wake-to-first-SDI since reset: {time.ticks_diff(time.ticks_us(), _RESET_TICKS_US) / 1000:.1f} ms")
+
 # def publish_to_mqtt(topic, payload): # [cite: 38]
 #     """Handles MQTT connection and publishing."""
 #     # print(f"Attempting to publish to MQTT: {topic} -> {payload}")
@@ -142,9 +333,15 @@ def get_battery_voltage(): # [cite: 150, 156]
 
 # --- Main Application Logic ---
 def run_sif_low_budget():
-    global is_calibrated, baseline_fft_magnitudes
+    global is_calibrated
     print(f"SIF Low-Budget Sensor (RP2040 - Conceptual) - Client ID: {MQTT_CLIENT_ID}")
     status_led.off()
+    first_cycle = True
+
+    # After deep sleep the RAM baseline is gone; restore it instead of recalibrating
+    if not is_calibrated and load_baseline_into(baseline_fft_magnitudes, baseline_fft_variance):
+        is_calibrated = True
+        print("Baseline restored from flash.")
 
     while True:
         if not is_calibrated:
@@ -152,8 +349,8 @@ def run_sif_low_budget():
             if detect_calibration_vibration_pattern():
                 status_led.on() # Indicate calibration in progress
                 print("Calibrating: Acquiring baseline signal...")
-                baseline_signal = sample_vibration_signal()
-                baseline_fft_magnitudes = simplified_fft_magnitudes(baseline_signal)
+                welch_spectrum_estimate(baseline_fft_magnitudes, baseline_fft_variance)
+                save_baseline(baseline_fft_magnitudes, baseline_fft_variance)
                 is_calibrated = True
                 status_led.off() # Calibration complete
                 print(f"Calibration successful. Baseline established. {len(baseline_fft_magnitudes)} FFT bins.")
@@ -165,13 +362,16 @@ def run_sif_low_budget():
         
         if is_calibrated:
             print("\n--- Monitoring Cycle ---")
-            current_signal = sample_vibration_signal()
-            current_fft_mags = simplified_fft_magnitudes(current_signal)
+            num_segments = welch_spectrum_estimate(current_fft_magnitudes, current_fft_variance)
             
-            sdi = basic_fractal_divergence(baseline_fft_magnitudes, current_fft_mags)
-            print(f"Timestamp: {time.time()}, SDI: {sdi:.4f}") # Using time.time() as a basic timestamp
+            sdi = basic_fractal_divergence(baseline_fft_magnitudes, current_fft_magnitudes)
+            ci = sdi_confidence_interval(baseline_fft_magnitudes, baseline_fft_variance, current_fft_magnitudes, current_fft_variance, num_segments)
+            print(f"Timestamp: {time.time()}, SDI: {sdi:.4f} ± {ci:.4f}") # Using time.time() as a basic timestamp
+            if first_cycle:
+                print(f"Wake-to-first-SDI since reset: {time.ticks_diff(time.ticks_us(), _RESET_TICKS_US) / 1000:.1f} ms")
+                first_cycle = False
 
-            # publish_to_mqtt(MQTT_TOPIC_DATA, f'{{"sdi": {sdi:.4f}}}')
+            # publish_to_mqtt(MQTT_TOPIC_DATA, f'{{"sdi": {sdi:.4f}, "ci": {ci:.4f}}}')
 
             if sdi > ALERT_SDI_THRESHOLD:
                 status_led.on()
@@ -198,11 +398,13 @@ def run_sif_low_budget():
         print("Woke up from conceptual sleep.")
 
 
-if __name__ == "__main__":
-    # This conceptual script will run the main logic directly.
-    # In a real device, this might be called after boot-up and initial setup.
+def main():
+    """Entry point. Frozen builds call it from the main.py stub printed by generate_frozen_tables.py."""
     try:
-        run_sif_low_budget()
+        if RUN_COLD_START_BENCHMARK:
+            benchmark_wake_to_first_sdi()
+        else:
+            run_sif_low_budget()
     except KeyboardInterrupt:
         print("Program stopped by user.")
     finally:
@@ -210,3 +412,7 @@ if __name__ == "__main__":
         status_led.off()
         # esp_power_control.off()
         print("SIF Low-Budget Sensor program ended.")
+
+if __name__ == "__main__":
+    # This conceptual script will run the main logic directly.
+    main()